@@ -1,21 +1,28 @@
 import json
+import logging
 import os
-import shutil
-import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from bedrock_agentcore_starter_toolkit import Runtime
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 
-import boto3
 from common import (
     create_guardrail,
     setup_complete_knowledge_base,
     attach_custom_policy,
     attach_policy,
+    get_account_id,
+    get_client,
+    list_attached_policy_arns,
+    poll_with_backoff,
 )
-from enableModel import enable_model
+from enableModel import enable_models
 
 # Configuration Constants
 REGION_NAME = "us-east-1"
-ACCOUNT_ID = boto3.client("sts").get_caller_identity()["Account"]
 
 # Agent Configuration
 AGENT_NAME = "my_agent"
@@ -23,14 +30,39 @@ AGENT_ENTRYPOINT = "main.py"
 REQUIREMENTS_FILE = "requirements.txt"
 PROTOCOL = "HTTP"  # or "MCP"
 
+# Maximum number of agent runtimes deleted in parallel during cleanup, kept low
+# enough to stay clear of AgentCore control-plane throttling
+CLEANUP_MAX_WORKERS = 10
+
+# Maximum time in seconds to wait for a single agent runtime to be deleted
+RUNTIME_DELETE_MAX_WAIT = 300
+
+# Logger the starter toolkit reports its progress on
+TOOLKIT_LOGGER_NAME = "bedrock_agentcore_starter_toolkit"
+
 # IAM Configuration
 EXECUTION_ROLE_NAME = "AmazonBedrockAgentCoreSDKRuntime"
 EXECUTION_POLICY_NAME = "AmazonBedrockAgentCoreRuntimeExecutionPolicy"
 EXECUTION_POLICY_FILE = "BedrockAgentCoreRuntimeExecutionPolicy.json"
 USERNAME = "learner"
 
+# Trust policy that allows AgentCore to assume the execution role
+EXECUTION_ROLE_TRUST_POLICY = json.dumps(
+    {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "bedrock-agentcore.amazonaws.com"},
+                "Action": "sts:AssumeRole",
+            }
+        ],
+    }
+)
+
 # S3 Configuration
-CONFIG_BACKUP_BUCKET_NAME = f"bedrock-agentcore-config-backup-{ACCOUNT_ID}"
+# The bucket is named "<prefix>-<account id>"
+CONFIG_BACKUP_BUCKET_PREFIX = "bedrock-agentcore-config-backup"
 # You can download it back using the following command:
 # aws s3 cp s3://bedrock-agentcore-config-backup-$(aws sts get-caller-identity --query Account --output text)/.bedrock_agentcore.yaml .bedrock_agentcore.yaml
 
@@ -38,7 +70,6 @@ CONFIG_BACKUP_BUCKET_NAME = f"bedrock-agentcore-config-backup-{ACCOUNT_ID}"
 KB_NAME = "bedrock-knowledge-base"
 VECTOR_BUCKET_NAME = "bedrock-vector-bucket"
 VECTOR_INDEX_NAME = "bedrock-vector-index"
-DOCUMENTS_FOLDER = os.path.join(os.getcwd(), "docs")
 
 # Bedrock Models
 BEDROCK_MODELS = [
@@ -56,76 +87,85 @@ USER_POLICIES = [
 ]
 
 # Directories
-POLICIES_DIR = os.path.join(os.path.dirname(__file__), "policies")
+TEMPLATES_DIR = os.path.dirname(os.path.abspath(__file__))
+POLICIES_DIR = os.path.join(TEMPLATES_DIR, "policies")
+DOCUMENTS_FOLDER = os.path.join(TEMPLATES_DIR, "docs")
 
 
-def cleanup_existing_agentcore_runtimes():
-    """Clean up existing AgentCore runtimes before creating new ones"""
-    print("🧹 Cleaning up existing AgentCore runtimes...")
+def list_agent_runtimes(bedrock_agentcore_client):
+    """Yield every AgentCore runtime in the account, fetching one page at a time"""
+    paginator = bedrock_agentcore_client.get_paginator("list_agent_runtimes")
+    for page in paginator.paginate(PaginationConfig={"PageSize": 100}):
+        yield from page.get("agentRuntimes", [])
+
 
+def delete_agent_runtime(bedrock_agentcore_client, runtime_id: str):
+    """Delete a single AgentCore runtime and wait until it is fully deleted"""
     try:
-        bedrock_agentcore_client = boto3.client(
-            "bedrock-agentcore-control", region_name=REGION_NAME
-        )
-        response = bedrock_agentcore_client.list_agent_runtimes()
-        agent_runtimes = response.get("agentRuntimes", [])
+        bedrock_agentcore_client.delete_agent_runtime(agentRuntimeId=runtime_id)
+        print(f"✅ Initiated deletion of agent runtime: {runtime_id}")
+
+        # Wait for deletion to complete, polling quickly at first so fast
+        # deletions are noticed right away, then backing off for slow ones
+        print(f"⏳ Waiting for agent runtime {runtime_id} to be fully deleted...")
+        start_time = time.time()
+        for _ in poll_with_backoff(RUNTIME_DELETE_MAX_WAIT, max_delay=30.0):
+            try:
+                # Try to get the runtime - if it doesn't exist, deletion is complete
+                bedrock_agentcore_client.get_agent_runtime(agentRuntimeId=runtime_id)
+                print(f"⏳ Still deleting {runtime_id}... ({int(time.time() - start_time)}s elapsed)")
+            except bedrock_agentcore_client.exceptions.ResourceNotFoundException:
+                # Runtime not found = deletion complete. Any other error (e.g.
+                # throttling or access denied) is reported below instead of being
+                # mistaken for a finished deletion.
+                print(f"✅ Agent runtime {runtime_id} fully deleted")
+                break
+        else:
+            # Launching a runtime with the same name would conflict with it
+            raise TimeoutError(
+                f"Agent runtime {runtime_id} was still deleting after {RUNTIME_DELETE_MAX_WAIT}s"
+            )
+
+    except TimeoutError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Could not delete agent runtime {runtime_id}: {e}")
 
-        for runtime in agent_runtimes:
-            runtime_name = runtime.get("name", "")
-            runtime_id = runtime.get("agentRuntimeId", "")
 
-            try:
-                bedrock_agentcore_client.delete_agent_runtime(agentRuntimeId=runtime_id)
-                print(f"✅ Initiated deletion of agent runtime: {runtime_id}")
+def cleanup_existing_agentcore_runtimes():
+    """Clean up existing AgentCore runtimes before creating new ones"""
+    print("🧹 Cleaning up existing AgentCore runtimes...")
 
-                # Wait for deletion to complete
-                print(
-                    f"⏳ Waiting for agent runtime {runtime_id} to be fully deleted..."
+    try:
+        bedrock_agentcore_client = get_client("bedrock-agentcore-control", REGION_NAME)
+
+        # Runtimes are independent, so delete them (and wait for each) concurrently,
+        # starting on each page of results as soon as it has been fetched
+        with ThreadPoolExecutor(max_workers=CLEANUP_MAX_WORKERS) as executor:
+            futures = [
+                executor.submit(
+                    delete_agent_runtime,
+                    bedrock_agentcore_client,
+                    runtime.get("agentRuntimeId", ""),
                 )
-                wait_interval = 5  # 10 seconds
-                elapsed_time = 0
-                agent_runtime_deleted = False
-
-                while not agent_runtime_deleted:
-                    try:
-                        # Try to get the runtime - if it doesn't exist, deletion is complete
-                        bedrock_agentcore_client.get_agent_runtime(
-                            agentRuntimeId=runtime_id
-                        )
-                        print(f"⏳ Still deleting... ({elapsed_time}s elapsed)")
-                        time.sleep(wait_interval)
-                        elapsed_time += wait_interval
-                    except Exception:
-                        # Runtime not found = deletion complete
-                        print(f"✅ Agent runtime {runtime_id} fully deleted")
-                        agent_runtime_deleted = True
-
-            except Exception as e:
-                print(f"⚠️  Could not delete agent runtime {runtime_id}: {e}")
+                for runtime in list_agent_runtimes(bedrock_agentcore_client)
+            ]
+            # Surface a runtime that didn't finish deleting in time
+            for future in futures:
+                future.result()
 
     except Exception as e:
-        raise (f"Error: Could not cleanup agent runtimes: {e}")
+        raise RuntimeError(f"Could not cleanup agent runtimes: {e}") from e
 
 
 def create_execution_role():
-    iam = boto3.client("iam")
+    iam = get_client("iam")
 
     # Create role if it doesn't exist
     try:
         iam.create_role(
             RoleName=EXECUTION_ROLE_NAME,
-            AssumeRolePolicyDocument=json.dumps(
-                {
-                    "Version": "2012-10-17",
-                    "Statement": [
-                        {
-                            "Effect": "Allow",
-                            "Principal": {"Service": "bedrock-agentcore.amazonaws.com"},
-                            "Action": "sts:AssumeRole",
-                        }
-                    ],
-                }
-            ),
+            AssumeRolePolicyDocument=EXECUTION_ROLE_TRUST_POLICY,
         )
         print(f"✅ Created IAM role {EXECUTION_ROLE_NAME}")
     except iam.exceptions.EntityAlreadyExistsException:
@@ -138,70 +178,95 @@ def create_execution_role():
         policy_json_path=policy_json_path,
         attach_to_type="role",
         attach_to_name=EXECUTION_ROLE_NAME,
-        replacements={"{AWS_ACCOUNT_ID}": ACCOUNT_ID},
+        replacements={"{AWS_ACCOUNT_ID}": get_account_id()},
     )
 
-    return f"arn:aws:iam::{ACCOUNT_ID}:role/{EXECUTION_ROLE_NAME}"
+    return f"arn:aws:iam::{get_account_id()}:role/{EXECUTION_ROLE_NAME}"
+
+
+class LogCollector(logging.Handler):
+    """Logging handler that keeps formatted records in a list instead of printing them"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
 
 
 def configure_agent(
+    execution_role_arn: str,
     entrypoint: str = AGENT_ENTRYPOINT,
     name: str = AGENT_NAME,
     region: str = REGION_NAME,
     requirements_file: str = REQUIREMENTS_FILE,
     protocol: str = PROTOCOL,
-):
-    if not shutil.which("agentcore"):
-        raise RuntimeError(
-            "agentcore CLI not found on PATH. "
-            "`pip install bedrock-agentcore-starter-toolkit` first."
+) -> Tuple[Runtime, List[str]]:
+    """Configure the agent in-process with the starter toolkit and return its Runtime and log lines"""
+    entrypoint_path = os.path.join(TEMPLATES_DIR, entrypoint)
+    requirements_path = os.path.join(TEMPLATES_DIR, requirements_file)
+
+    runtime = Runtime()
+
+    # This runs alongside the knowledge base setup, so collect the toolkit's
+    # log output for the caller to print afterwards instead of letting it mix
+    # with the knowledge base progress
+    toolkit_logger = logging.getLogger(TOOLKIT_LOGGER_NAME)
+    saved_handlers, saved_propagate = toolkit_logger.handlers[:], toolkit_logger.propagate
+    collector = LogCollector()
+    toolkit_logger.handlers = [collector]
+    toolkit_logger.propagate = False
+    try:
+        # Same settings as `agentcore configure`, without spawning the CLI: the
+        # ECR repository is auto-created, there is no OAuth authorizer and
+        # OpenTelemetry is disabled
+        runtime.configure(
+            entrypoint=entrypoint_path,
+            agent_name=name,
+            region=region,
+            protocol=protocol,
+            execution_role=execution_role_arn,
+            auto_create_ecr=True,
+            requirements_file=requirements_path,
+            authorizer_configuration=None,
+            disable_otel=True,
         )
+    finally:
+        toolkit_logger.handlers = saved_handlers
+        toolkit_logger.propagate = saved_propagate
+    return runtime, collector.lines
 
-    entrypoint_path = os.path.join(os.path.dirname(__file__), entrypoint)
-    requirements_path = os.path.join(os.path.dirname(__file__), requirements_file)
-
-    cfg_cmd = [
-        "agentcore",
-        "configure",
-        "--entrypoint",
-        entrypoint_path,
-        "--name",
-        name,
-        "--region",
-        region,
-        "--protocol",
-        protocol,
-        "--ecr",
-        "auto",  # avoids the “Press Enter to auto-create ECR” prompt
-        "--requirements-file",
-        requirements_path,
-        "--disable-otel",  # Disable OpenTelemetry noise
-    ]
-
-    # Create execution service role with BedrockAgentCoreRuntimeExecutionPolicy
-    execution_role_arn = create_execution_role()
-    cfg_cmd += ["--execution-role", execution_role_arn]
-
-    cfg_cmd += ["--authorizer-config", "null"]
-
-    # This will not prompt as long as the above values are sufficient.
-    subprocess.run(cfg_cmd, check=True)
 
-
-def create_config_backup_bucket(bucket_name: str = CONFIG_BACKUP_BUCKET_NAME):
+def create_config_backup_bucket(bucket_name: Optional[str] = None):
     """Create S3 bucket and upload the .bedrock_agentcore.yaml configuration file"""
+    bucket_name = bucket_name or f"{CONFIG_BACKUP_BUCKET_PREFIX}-{get_account_id()}"
     try:
-        s3_client = boto3.client("s3", region_name=REGION_NAME)
+        s3_client = get_client("s3", REGION_NAME)
 
-        # Create the bucket
+        # Check for the bucket with a cheap HEAD first, so re-runs skip the create
+        # call. Any error (not found, or owned by someone else) falls through to
+        # create_bucket below, which reports it.
+        bucket_exists = False
         try:
-            s3_client.create_bucket(Bucket=bucket_name)
-            print(f"✅ Created S3 bucket: {bucket_name}")
-        except s3_client.exceptions.BucketAlreadyOwnedByYou:
+            s3_client.head_bucket(
+                Bucket=bucket_name, ExpectedBucketOwner=get_account_id()
+            )
+            bucket_exists = True
             print(f"✅ S3 bucket {bucket_name} already exists and is owned by you")
-        except s3_client.exceptions.BucketAlreadyExists:
-            print(f"❌ S3 bucket {bucket_name} already exists")
-            raise RuntimeError(f"Cannot use bucket {bucket_name} - already exists and owned by someone else")
+        except ClientError:
+            pass
+
+        # Create the bucket
+        if not bucket_exists:
+            try:
+                s3_client.create_bucket(Bucket=bucket_name)
+                print(f"✅ Created S3 bucket: {bucket_name}")
+            except s3_client.exceptions.BucketAlreadyOwnedByYou:
+                print(f"✅ S3 bucket {bucket_name} already exists and is owned by you")
+            except s3_client.exceptions.BucketAlreadyExists:
+                print(f"❌ S3 bucket {bucket_name} already exists")
+                raise RuntimeError(f"Cannot use bucket {bucket_name} - already exists and owned by someone else")
         
         # Check if the config file exists
         config_file_path = os.path.join(os.getcwd(), ".bedrock_agentcore.yaml")
@@ -211,8 +276,13 @@ def create_config_backup_bucket(bucket_name: str = CONFIG_BACKUP_BUCKET_NAME):
         
         # Upload the .bedrock_agentcore.yaml file
         try:
+            # The file is tiny, so upload it with a single PutObject on this thread
+            # rather than through the transfer manager's thread pool
             s3_client.upload_file(
-                config_file_path, bucket_name, ".bedrock_agentcore.yaml"
+                config_file_path,
+                bucket_name,
+                ".bedrock_agentcore.yaml",
+                Config=TransferConfig(use_threads=False),
             )
             print(f"✅ Uploaded .bedrock_agentcore.yaml to bucket: {bucket_name}")
         except Exception as e:
@@ -231,54 +301,123 @@ def create_config_backup_bucket(bucket_name: str = CONFIG_BACKUP_BUCKET_NAME):
         raise
 
 
-def launch_agent(guardrail_id: str, knowledge_base_id: str):
-    launch_cmd = [
-        "agentcore",
-        "launch",
-        "--env",
-        f"GUARDRAIL_ID={guardrail_id}",
-        "--env",
-        f"KNOWLEDGE_BASE_ID={knowledge_base_id}",
-    ]
-
-    subprocess.run(launch_cmd, check=True)
+def launch_agent(runtime: Runtime, guardrail_id: str, knowledge_base_id: str):
+    """Build and deploy the configured agent to AgentCore with CodeBuild"""
+    runtime.launch(
+        env_vars={
+            "GUARDRAIL_ID": guardrail_id,
+            "KNOWLEDGE_BASE_ID": knowledge_base_id,
+        }
+    )
 
 
 def main():
     # 0. Cleanup existing resources first
     cleanup_existing_agentcore_runtimes()
 
-    # 1. Grant user policies
+    # 1. Grant user policies, skipping the ones that are already attached (on
+    # re-runs that is usually all of them). If the lookup fails, attach_policy
+    # checks and reports each policy on its own.
+    try:
+        attached_policies = list_attached_policy_arns("user", USERNAME)
+    except Exception:
+        attached_policies = set()
     for policy in USER_POLICIES:
-        success, _ = attach_policy(
-            attach_to_type="user",
-            attach_to_name=USERNAME,
-            policy_arn=policy,
+        if policy in attached_policies:
+            print(f"✅ Policy {policy} already attached to user {USERNAME}")
+    missing_policies = [p for p in USER_POLICIES if p not in attached_policies]
+
+    # 2. Enable the Bedrock models in the background while the missing policies
+    # are attached. Model enablement logs into model_messages, which are printed
+    # once it is done, so only the policy steps print in the meantime.
+    model_messages = []
+    policies_granted = True
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        models_future = executor.submit(
+            enable_models, BEDROCK_MODELS, log=model_messages.append
         )
-        if not success:
-            print(f"❌ Failed to grant {policy} to {USERNAME}. Exiting.")
-            exit(1)
 
-    # 1.2 grant extra permissions related to AgentCore via custom policy file
-    attach_custom_policy(
-        policy_name="agentCoreCustomPolicy",
-        policy_json_path=os.path.join(POLICIES_DIR, "agentCoreCustomPolicy.json"),
-        attach_to_type="user",
-        attach_to_name="learner",
-    )
-    print("✅ agentCoreCustomPolicy policy created and attached to learner")
+        for policy in missing_policies:
+            success, _ = attach_policy(
+                attach_to_type="user",
+                attach_to_name=USERNAME,
+                policy_arn=policy,
+            )
+            if not success:
+                print(f"❌ Failed to grant {policy} to {USERNAME}. Exiting.")
+                policies_granted = False
+                break
+
+        if policies_granted:
+            # 1.2 grant extra permissions related to AgentCore via custom policy file
+            attach_custom_policy(
+                policy_name="agentCoreCustomPolicy",
+                policy_json_path=os.path.join(POLICIES_DIR, "agentCoreCustomPolicy.json"),
+                attach_to_type="user",
+                attach_to_name="learner",
+            )
+            print("✅ agentCoreCustomPolicy policy created and attached to learner")
+
+    for message in model_messages:
+        print(message)
+    if not policies_granted:
+        exit(1)
 
-    # 2. Enable the Bedrock models
-    for model in BEDROCK_MODELS:
-        result = enable_model(model)
+    for model, result in models_future.result().items():
         if result["status"] == "enabled":
             print(f"✅ Bedrock model {model} enabled")
         else:
             print(f"❌ Failed to enable Bedrock model {model}")
             exit(1)
 
-    # 3. Create guardrail
-    guardrail = create_guardrail(REGION_NAME)
+    # Create execution service role with BedrockAgentCoreRuntimeExecutionPolicy
+    # up front: it only takes a few IAM calls and prints as it goes
+    execution_role_arn = create_execution_role()
+
+    # 3. Create guardrail, 4. setup complete knowledge base and 5. configure the
+    # agent. None of them depend on each other, so the guardrail and the agent
+    # configuration are done while the (much slower) knowledge base setup runs.
+    # Only the knowledge base setup prints while they are running, so its
+    # step-by-step output stays readable.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        guardrail_future = executor.submit(create_guardrail, REGION_NAME)
+        runtime_future = executor.submit(configure_agent, execution_role_arn)
+        knowledge_base_future = executor.submit(
+            setup_complete_knowledge_base,
+            documents_folder=DOCUMENTS_FOLDER,
+            vector_bucket_name=VECTOR_BUCKET_NAME,
+            vector_index_name=VECTOR_INDEX_NAME,
+            kb_name=KB_NAME,
+            region_name=REGION_NAME,
+        )
+
+        # Configuring takes seconds while the knowledge base takes minutes, so
+        # report a configure failure as soon as it happens rather than after
+        # the knowledge base is done
+        configure_error = runtime_future.exception()
+        if configure_error:
+            # A single print call, so it can't be split by the knowledge base output
+            print(
+                f"❌ Failed to configure agent: {configure_error}\n"
+                "⏳ Waiting for the knowledge base setup to finish before exiting..."
+            )
+
+    # The guardrail is created silently; print its status now that the
+    # knowledge base setup is no longer writing to the console (also when
+    # exiting below, so the user knows whether the guardrail was created)
+    guardrail, guardrail_messages = guardrail_future.result()
+    for message in guardrail_messages:
+        print(message)
+
+    if configure_error:
+        exit(1)
+
+    # The agent was configured silently; print the toolkit's output now
+    runtime, configure_log = runtime_future.result()
+    for line in configure_log:
+        print(line)
+    print("✅ Agent is configured")
+
     if not guardrail:
         print("❌ Failed to create guardrail. Exiting.")
         exit(1)
@@ -286,14 +425,7 @@ def main():
         guardrail_id = guardrail["guardrailId"]
         print(f"✅ Guardrail is ready to use with ID: {guardrail_id}")
 
-    # 4. Setup complete knowledge base
-    result = setup_complete_knowledge_base(
-        documents_folder=DOCUMENTS_FOLDER,
-        vector_bucket_name=VECTOR_BUCKET_NAME,
-        vector_index_name=VECTOR_INDEX_NAME,
-        kb_name=KB_NAME,
-        region_name=REGION_NAME,
-    )
+    result = knowledge_base_future.result()
 
     # Check if knowledge base setup was successful
     if result:
@@ -305,12 +437,9 @@ def main():
         print("❌ Failed to create knowledge base. Exiting.")
         exit(1)
 
-    # 5. Configure and then launch agent
-    configure_agent()
-    print("✅ Agent is configured")
-
     # 6. Launch agent
     launch_agent(
+        runtime,
         guardrail_id=guardrail_id,
         knowledge_base_id=knowledge_base_id,
     )
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from common import (
     create_guardrail,
@@ -6,7 +7,7 @@ from common import (
     attach_custom_policy,
     attach_policy,
 )
-from enableModel import enable_model
+from enableModel import enable_models
 
 # Configuration
 BEDROCK_MODELS = [
@@ -15,70 +16,97 @@ BEDROCK_MODELS = [
     "amazon.nova-pro-v1:0",
 ]
 USER_POLICIES = ["arn:aws:iam::aws:policy/AmazonBedrockFullAccess"]
-DOCUMENTS_FOLDER = os.path.join(os.getcwd(), "docs")
 VECTOR_BUCKET_NAME = "bedrock-vector-bucket"
 VECTOR_INDEX_NAME = "bedrock-vector-index"
 KB_NAME = "bedrock-knowledge-base"
 REGION_NAME = "us-east-1"
 
-POLICIES_DIR = os.path.join(os.path.dirname(__file__), "policies")
+# Directories
+TEMPLATES_DIR = os.path.dirname(os.path.abspath(__file__))
+POLICIES_DIR = os.path.join(TEMPLATES_DIR, "policies")
+DOCUMENTS_FOLDER = os.path.join(TEMPLATES_DIR, "docs")
 
 
 def main():
-    # 1. Grant user policies
-    for policy in USER_POLICIES:
-        success, _ = attach_policy(
-            attach_to_type="user",
-            attach_to_name="learner",
-            policy_arn=policy,
+    # 2. Enable the Bedrock models in the background while 1. the user policies
+    # are granted. Model enablement logs into model_messages, which are printed
+    # once it is done, so only the policy steps print in the meantime.
+    model_messages = []
+    policies_granted = True
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        models_future = executor.submit(
+            enable_models, BEDROCK_MODELS, log=model_messages.append
         )
-        if not success:
-            print(f"❌ Failed to grant {policy} to learner. Exiting.")
-            exit(1)
 
-    # 1.1 grant s3vectors full access via custom policy file
-    attach_custom_policy(
-        policy_name="S3VectorsFullAccess",
-        policy_json_path=os.path.join(POLICIES_DIR, "S3VectorsFullAccess.json"),
-        attach_to_type="user",
-        attach_to_name="learner",
-    )
-    print("✅ S3VectorsFullAccess policy created and attached to learner")
-
-    # 1.2 grant iam pass role via custom policy file
-    attach_custom_policy(
-        policy_name="IAMPassRole",
-        policy_json_path=os.path.join(POLICIES_DIR, "IAMPassRole.json"),
-        attach_to_type="user",
-        attach_to_name="learner",
-    )
-    print("✅ IAMPassRole policy created and attached to learner")
-
-    # 2. Enable the Bedrock models
-    for model in BEDROCK_MODELS:
-        result = enable_model(model)
+        for policy in USER_POLICIES:
+            success, _ = attach_policy(
+                attach_to_type="user",
+                attach_to_name="learner",
+                policy_arn=policy,
+            )
+            if not success:
+                print(f"❌ Failed to grant {policy} to learner. Exiting.")
+                policies_granted = False
+                break
+
+        if policies_granted:
+            # 1.1 grant s3vectors full access via custom policy file
+            attach_custom_policy(
+                policy_name="S3VectorsFullAccess",
+                policy_json_path=os.path.join(POLICIES_DIR, "S3VectorsFullAccess.json"),
+                attach_to_type="user",
+                attach_to_name="learner",
+            )
+            print("✅ S3VectorsFullAccess policy created and attached to learner")
+
+            # 1.2 grant iam pass role via custom policy file
+            attach_custom_policy(
+                policy_name="IAMPassRole",
+                policy_json_path=os.path.join(POLICIES_DIR, "IAMPassRole.json"),
+                attach_to_type="user",
+                attach_to_name="learner",
+            )
+            print("✅ IAMPassRole policy created and attached to learner")
+
+    for message in model_messages:
+        print(message)
+    if not policies_granted:
+        exit(1)
+
+    for model, result in models_future.result().items():
         if result["status"] == "enabled":
             print(f"✅ Bedrock model {model} enabled")
         else:
             print(f"❌ Failed to enable Bedrock model {model}")
             exit(1)
 
-    # 3. Create guardrail
-    guardrail = create_guardrail(REGION_NAME)
+    # 3. Create guardrail and 4. setup complete knowledge base. They don't
+    # depend on each other, so the guardrail is created while the (much slower)
+    # knowledge base setup runs. Only the knowledge base setup prints while both
+    # are running, so its step-by-step output stays readable.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        guardrail_future = executor.submit(create_guardrail, REGION_NAME)
+        knowledge_base_future = executor.submit(
+            setup_complete_knowledge_base,
+            documents_folder=DOCUMENTS_FOLDER,
+            vector_bucket_name=VECTOR_BUCKET_NAME,
+            vector_index_name=VECTOR_INDEX_NAME,
+            kb_name=KB_NAME,
+            region_name=REGION_NAME,
+        )
+
+    # The guardrail is created silently; print its status now that the
+    # knowledge base setup is no longer writing to the console
+    guardrail, guardrail_messages = guardrail_future.result()
+    for message in guardrail_messages:
+        print(message)
     if not guardrail:
         print("❌ Failed to create guardrail. Exiting.")
         exit(1)
     else:
         print(f"✅ Guardrail is ready to use with ID: {guardrail['guardrailId']}")
 
-    # 4. Setup complete knowledge base
-    result = setup_complete_knowledge_base(
-        documents_folder=DOCUMENTS_FOLDER,
-        vector_bucket_name=VECTOR_BUCKET_NAME,
-        vector_index_name=VECTOR_INDEX_NAME,
-        kb_name=KB_NAME,
-        region_name=REGION_NAME,
-    )
+    result = knowledge_base_future.result()
 
     # Check if knowledge base setup was successful
     if result:
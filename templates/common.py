@@ -1,16 +1,240 @@
+import hashlib
 import json
 import os
+import random
 import shutil
+import threading
 import time
 import urllib.request
 import uuid
 import zipfile
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Shared client configuration: bounded timeouts, a connection pool large enough
+# for the concurrent helpers below, and adaptive retries to back off when throttled
+BOTO_CONFIG = Config(
+    max_pool_connections=32,
+    retries={"mode": "adaptive", "max_attempts": 5},
+    connect_timeout=5,
+    read_timeout=30,
+    tcp_keepalive=True,
+)
+
+# IAM policy templates shipped alongside these scripts
+POLICIES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "policies")
+
+# Maximum number of concurrent Bedrock embedding requests (override with
+# EMBEDDING_MAX_WORKERS to match the account's embedding model quota)
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "8"))
+
+# Local cache of document embeddings, so re-runs skip unchanged documents
+EMBEDDING_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "kb-embeddings")
+
+# S3 Vectors accepts at most 500 vectors per PutVectors call
+PUT_VECTORS_BATCH_SIZE = 500
+PUT_VECTORS_MAX_WORKERS = 4
+
+# S3 Vectors accepts at most 100 keys per GetVectors call
+GET_VECTORS_BATCH_SIZE = 100
+
+# Vector metadata key holding the document hash used to skip unchanged documents.
+# The index declares it non-filterable, so it doesn't count against the
+# filterable metadata size limit
+CONTENT_HASH_METADATA_KEY = "content_hash"
+
+# A new Knowledge Base role and its policies take a while to propagate through
+# IAM. Until they have, create_knowledge_base fails with an AccessDenied error or
+# a ValidationException whose message contains one of these phrases; those are
+# retried for up to KB_ROLE_PROPAGATION_MAX_WAIT seconds
+KB_ROLE_PROPAGATION_MAX_WAIT = 120
+KB_ROLE_PROPAGATION_MESSAGES = (
+    "unable to assume",
+    "not authorized",
+    "access denied",
+    "accessdenied",
+    "permission",
+)
+
+# Trust policy that allows Bedrock to assume the Knowledge Base role
+KB_ROLE_TRUST_POLICY = json.dumps(
+    {
+        "Version": "2012-10-17",
+        "Statement": [
+            {
+                "Effect": "Allow",
+                "Principal": {"Service": "bedrock.amazonaws.com"},
+                "Action": "sts:AssumeRole",
+            }
+        ],
+    }
+)
+
+# Guardrail definition used by create_guardrail
+GUARDRAIL_NAME = "aws-assistant-guardrail"
+GUARDRAIL_DESCRIPTION = (
+    "AWS assistant guardrail: deny hacking topics on input and apply violence "
+    "category moderation on input."
+)
+GUARDRAIL_BLOCKED_MESSAGE = "Your input contains content that is not allowed."
+GUARDRAIL_CONTENT_POLICY = {
+    "filtersConfig": [
+        {
+            "type": "VIOLENCE",
+            "inputStrength": "HIGH",
+            "outputStrength": "NONE",
+        },
+    ]
+}
+GUARDRAIL_TOPIC_POLICY = {
+    "topicsConfig": [
+        {
+            "name": "Security Exploits and Hacking",
+            "definition": (
+                "Content describing or instructing on security exploits, hacking "
+                "techniques, or malicious activities against AWS or any systems."
+            ),
+            "examples": [
+                "hack",
+                "exploit",
+                "breach",
+                "attack",
+            ],
+            "type": "DENY",
+        }
+    ]
+}
+
+
+# boto3 sessions are not thread-safe, so each thread gets its own session and clients
+_thread_local = threading.local()
+
+
+def get_session() -> boto3.session.Session:
+    """
+    Get the boto3 session for the current thread, creating it on first use.
+
+    Returns:
+        boto3 Session owned by the calling thread
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = _thread_local.session = boto3.session.Session()
+        _thread_local.clients = {}
+    return session
+
+
+def get_client(service_name: str, region_name: Optional[str] = None):
+    """
+    Get a shared boto3 client for a service and region.
+
+    Clients are created once per thread from that thread's session, so credential
+    resolution and HTTP connection pools are reused across calls instead of rebuilt
+    every time, and worker threads never contend on a shared session.
+
+    Args:
+        service_name: AWS service name (e.g. "iam", "bedrock-runtime")
+        region_name: AWS region name (defaults to the session's region)
+
+    Returns:
+        boto3 client configured with BOTO_CONFIG
+    """
+    session = get_session()
+    key = (service_name, region_name)
+    client = _thread_local.clients.get(key)
+    if client is None:
+        client = session.client(
+            service_name, region_name=region_name, config=BOTO_CONFIG
+        )
+        _thread_local.clients[key] = client
+    return client
+
+
+@lru_cache(maxsize=None)
+def get_account_id() -> str:
+    """
+    Get the AWS account ID, from the AWS_ACCOUNT_ID environment variable if set,
+    otherwise from STS.
+
+    The result is cached, so STS is called at most once per process. It is
+    deliberately not cached on disk: the learner's credentials can point at a
+    different account on the next run, and a stale ID would end up in every
+    IAM ARN and bucket name built from it.
+
+    Returns:
+        12-digit AWS account ID
+    """
+    return os.getenv("AWS_ACCOUNT_ID") or get_client("sts").get_caller_identity()[
+        "Account"
+    ]
+
+
+def poll_with_backoff(
+    max_wait_time: float, initial_delay: float = 0.5, max_delay: float = 8.0
+) -> Iterator[int]:
+    """
+    Yield polling attempts, sleeping with jittered exponential backoff in between.
+
+    The first attempt is yielded immediately, so a resource that is already ready
+    costs no sleep at all. Iteration stops once max_wait_time has elapsed.
+
+    Args:
+        max_wait_time: Maximum total wait time in seconds
+        initial_delay: Delay before the second attempt in seconds
+        max_delay: Upper bound for the delay between attempts in seconds
+
+    Yields:
+        Attempt number, starting at 0
+    """
+    deadline = time.time() + max_wait_time
+    delay = initial_delay
+    attempt = 0
+    while True:
+        yield attempt
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+
+        time.sleep(min(delay * random.uniform(0.5, 1.0), remaining))
+        delay = min(delay * 2, max_delay)
+        attempt += 1
+
+
+def list_attached_policy_arns(attach_to_type: str, attach_to_name: str) -> set:
+    """
+    List the ARNs of all managed policies attached to a user or role.
+
+    Args:
+        attach_to_type: "user" or "role"
+        attach_to_name: IAM UserName or RoleName
+
+    Returns:
+        Set of attached policy ARNs, across every page of results (requested at
+        the IAM maximum of 1000 per page)
+    """
+    iam_client = get_client("iam")
+    if attach_to_type == "user":
+        paginator = iam_client.get_paginator("list_attached_user_policies")
+        pages = paginator.paginate(
+            UserName=attach_to_name, PaginationConfig={"PageSize": 1000}
+        )
+    else:
+        paginator = iam_client.get_paginator("list_attached_role_policies")
+        pages = paginator.paginate(
+            RoleName=attach_to_name, PaginationConfig={"PageSize": 1000}
+        )
+    return {
+        policy["PolicyArn"] for page in pages for policy in page["AttachedPolicies"]
+    }
+
 
 def attach_policy(
     attach_to_type: str,
@@ -23,7 +247,7 @@ def attach_policy(
     Returns (success, policy_arn_if_known).
     """
     try:
-        iam_client = boto3.client("iam")
+        iam_client = get_client("iam")
 
         # Validate target principal exists
         try:
@@ -41,16 +265,8 @@ def attach_policy(
         # Check if already attached
         already_attached = False
         try:
-            if attach_to_type == "user":
-                attached = iam_client.list_attached_user_policies(
-                    UserName=attach_to_name
-                )
-            else:
-                attached = iam_client.list_attached_role_policies(
-                    RoleName=attach_to_name
-                )
-            already_attached = any(
-                p.get("PolicyArn") == policy_arn for p in attached["AttachedPolicies"]
+            already_attached = policy_arn in list_attached_policy_arns(
+                attach_to_type, attach_to_name
             )
         except ClientError as e:
             print(f"⚠️  Could not list attached policies: {e}")
@@ -91,10 +307,8 @@ def create_policy(policy_name: str, policy_document: Dict) -> Optional[str]:
     Returns the policy ARN (existing or newly created) if successful, otherwise None.
     """
     try:
-        iam_client = boto3.client("iam")
-        sts_client = boto3.client("sts")
-        account_id = sts_client.get_caller_identity()["Account"]
-        policy_arn = f"arn:aws:iam::{account_id}:policy/{policy_name}"
+        iam_client = get_client("iam")
+        policy_arn = f"arn:aws:iam::{get_account_id()}:policy/{policy_name}"
 
         # Try to create policy
         try:
@@ -165,101 +379,94 @@ def attach_custom_policy(
         return None
 
 
-def create_guardrail(region_name: str = "us-east-1"):
+def find_guardrail(control_client, name: str) -> Optional[Dict]:
     """
-    Create a guardrail for AWS Bedrock with predefined security policies.
+    Look up a Bedrock guardrail by name.
 
     Args:
-        region_name: AWS region name
+        control_client: boto3 Bedrock client
+        name: Name of the guardrail
 
     Returns:
-        dict: Response from create_guardrail API call, or None if failed.
+        dict: Guardrail ID, ARN and version if found, None otherwise.
     """
-    control_client = boto3.client("bedrock", region_name=region_name)
+    paginator = control_client.get_paginator("list_guardrails")
+    for page in paginator.paginate():
+        for summary in page.get("guardrails", []):
+            if summary.get("name") == name:
+                return {
+                    "guardrailId": summary.get("guardrailId") or summary.get("id"),
+                    "guardrailArn": summary.get("guardrailArn") or summary.get("arn"),
+                    "version": summary.get("version", "DRAFT"),
+                }
+    return None
 
-    # Define the standard blocked message
-    blocked_message = "Your input contains content that is not allowed."
 
-    # Generate unique name
-    name = "aws-assistant-guardrail"
+def create_guardrail(
+    region_name: str = "us-east-1",
+) -> Tuple[Optional[Dict], List[str]]:
+    """
+    Create a guardrail for AWS Bedrock with predefined security policies.
 
-    # Define description
-    description = (
-        "AWS assistant guardrail: deny hacking topics on input and apply violence "
-        "category moderation on input."
-    )
+    An existing guardrail with the same name is reused instead of recreated.
+    Nothing is printed, so this can run alongside another setup step; the
+    caller prints the returned status messages once it has the result.
+
+    Args:
+        region_name: AWS region name
+
+    Returns:
+        Tuple of (response from create_guardrail API call or None if failed,
+        list of status messages)
+    """
+    control_client = get_client("bedrock", region_name)
+    name = GUARDRAIL_NAME
+    messages = []
 
     try:
+        # Reuse the guardrail from a previous run without a create round trip
+        existing = find_guardrail(control_client, name)
+        if existing:
+            messages.append("✅ Guardrail already exists, reusing it")
+            messages.append(f"Guardrail ID: {existing['guardrailId']}")
+            return existing, messages
+
         response = control_client.create_guardrail(
             name=name,
-            description=description,
-            contentPolicyConfig={
-                "filtersConfig": [
-                    {
-                        "type": "VIOLENCE",
-                        "inputStrength": "HIGH",
-                        "outputStrength": "NONE",
-                    },
-                ]
-            },
-            topicPolicyConfig={
-                "topicsConfig": [
-                    {
-                        "name": "Security Exploits and Hacking",
-                        "definition": (
-                            "Content describing or instructing on security exploits, hacking "
-                            "techniques, or malicious activities against AWS or any systems."
-                        ),
-                        "examples": [
-                            "hack",
-                            "exploit",
-                            "breach",
-                            "attack",
-                        ],
-                        "type": "DENY",
-                    }
-                ]
-            },
-            blockedInputMessaging=blocked_message,
-            blockedOutputsMessaging=blocked_message,
+            description=GUARDRAIL_DESCRIPTION,
+            contentPolicyConfig=GUARDRAIL_CONTENT_POLICY,
+            topicPolicyConfig=GUARDRAIL_TOPIC_POLICY,
+            blockedInputMessaging=GUARDRAIL_BLOCKED_MESSAGE,
+            blockedOutputsMessaging=GUARDRAIL_BLOCKED_MESSAGE,
         )
 
         # Check if guardrail creation was successful
         if "guardrailId" in response and "guardrailArn" in response:
-            print("✅ Guardrail created successfully!")
-            print(f"Guardrail ID: {response['guardrailId']}")
-            print(f"Guardrail ARN: {response['guardrailArn']}")
-            print(f"Version: {response.get('version', 'N/A')}")
-            return response
+            messages.append("✅ Guardrail created successfully!")
+            messages.append(f"Guardrail ID: {response['guardrailId']}")
+            messages.append(f"Guardrail ARN: {response['guardrailArn']}")
+            messages.append(f"Version: {response.get('version', 'N/A')}")
+            return response, messages
         else:
-            print("❌ Guardrail creation failed - missing expected response fields")
-            return None
+            messages.append(
+                "❌ Guardrail creation failed - missing expected response fields"
+            )
+            return None, messages
 
     except Exception as e:
         # If guardrail with the same name already exists, reuse it
         message = str(e)
         if "ConflictException" in message or "already has this name" in message:
             try:
-                summaries = control_client.list_guardrails().get("guardrails", [])
-                existing = next(
-                    (g for g in summaries if g.get("name") == name),
-                    None,
-                )
+                existing = find_guardrail(control_client, name)
                 if existing:
-                    print("✅ Guardrail already exists, reusing it")
-                    # Get full details if needed
-                    guardrail_id = existing.get("guardrailId") or existing.get("id")
-                    guardrail_arn = existing.get("guardrailArn") or existing.get("arn")
-                    return {
-                        "guardrailId": guardrail_id,
-                        "guardrailArn": guardrail_arn,
-                        "version": existing.get("version", "DRAFT"),
-                    }
+                    messages.append("✅ Guardrail already exists, reusing it")
+                    return existing, messages
             except Exception as inner:
-                print(f"⚠️  Failed to look up existing guardrail: {inner}")
+                messages.append(f"⚠️  Failed to look up existing guardrail: {inner}")
 
-        print(f"❌ Failed to create guardrail: {message}")
-        return None
+        messages.append(f"❌ Failed to create guardrail: {message}")
+        return None, messages
 
 
 def load_documents_from_folder(folder_path: str) -> List[Dict]:
@@ -345,6 +552,11 @@ def setup_s3_vectors(
                 dimension=embedding_dimensions,
                 distanceMetric="cosine",
                 dataType="float32",
+                # The content hash is only read back to skip unchanged documents,
+                # so keep it out of the filterable metadata size budget
+                metadataConfiguration={
+                    "nonFilterableMetadataKeys": [CONTENT_HASH_METADATA_KEY]
+                },
             )
             print(f"✅ Created vector index: {vector_index_name}")
         except Exception as e:
@@ -367,6 +579,210 @@ def setup_s3_vectors(
         return None
 
 
+def get_embedding_cache_path(
+    content: str, embedding_model_id: str, embedding_dimensions: int
+) -> Path:
+    """
+    Get the local cache file for an embedding, keyed by model, dimensions and
+    the SHA-256 of the content.
+
+    Args:
+        content: Text that was embedded
+        embedding_model_id: Model ID for embeddings
+        embedding_dimensions: Dimensions for embeddings
+
+    Returns:
+        Path of the cache file (which may not exist yet)
+    """
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return (
+        Path(EMBEDDING_CACHE_DIR)
+        / embedding_model_id.replace(":", "_")
+        / str(embedding_dimensions)
+        / f"{content_hash}.f32"
+    )
+
+
+def load_cached_embedding(
+    content: str, embedding_model_id: str, embedding_dimensions: int
+) -> Optional[List[float]]:
+    """
+    Load a previously generated embedding from the local cache.
+
+    Args:
+        content: Text that was embedded
+        embedding_model_id: Model ID for embeddings
+        embedding_dimensions: Dimensions for embeddings
+
+    Returns:
+        Embedding values if cached, None otherwise
+    """
+    cache_path = get_embedding_cache_path(
+        content, embedding_model_id, embedding_dimensions
+    )
+    try:
+        values = array("f", cache_path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+    if len(values) != embedding_dimensions:
+        return None
+    return values.tolist()
+
+
+def save_cached_embedding(
+    content: str,
+    embedding_model_id: str,
+    embedding_dimensions: int,
+    embedding: List[float],
+) -> None:
+    """
+    Store an embedding in the local cache as raw float32 values.
+
+    Caching is best effort: failures to write are ignored.
+
+    Args:
+        content: Text that was embedded
+        embedding_model_id: Model ID for embeddings
+        embedding_dimensions: Dimensions for embeddings
+        embedding: Embedding values returned by Bedrock
+    """
+    cache_path = get_embedding_cache_path(
+        content, embedding_model_id, embedding_dimensions
+    )
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial file
+        tmp_path = cache_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(array("f", embedding).tobytes())
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def embed_document(
+    content: str,
+    bedrock_runtime_client,
+    embedding_model_id: str = "amazon.titan-embed-text-v2:0",
+    embedding_dimensions: int = 1024,
+) -> Tuple[List[float], bool]:
+    """
+    Generate an embedding for a single document's content.
+
+    Runs on worker threads, so it reports nothing itself and raises on failure.
+
+    Args:
+        content: Document text to embed
+        bedrock_runtime_client: boto3 Bedrock Runtime client
+        embedding_model_id: Model ID for embeddings
+        embedding_dimensions: Dimensions for embeddings
+
+    Returns:
+        Tuple of (embedding, whether it came from the local cache)
+    """
+    # Reuse a locally cached embedding when this exact content was seen before
+    embedding = load_cached_embedding(content, embedding_model_id, embedding_dimensions)
+    if embedding is not None:
+        return embedding, True
+
+    # Create embedding request
+    embedding_request = {
+        "inputText": content,
+        "dimensions": embedding_dimensions,
+        "normalize": True,
+    }
+
+    # Get embedding from Bedrock
+    response = bedrock_runtime_client.invoke_model(
+        modelId=embedding_model_id, body=json.dumps(embedding_request)
+    )
+
+    response_body = json.loads(response["body"].read())
+    embedding = response_body["embedding"]
+
+    save_cached_embedding(content, embedding_model_id, embedding_dimensions, embedding)
+    return embedding, False
+
+
+def get_document_hash(
+    doc: Dict, embedding_model_id: str, embedding_dimensions: int
+) -> str:
+    """
+    Hash everything that goes into a document's stored vector, so an unchanged
+    document can be recognised in S3 Vectors without re-embedding it.
+
+    Args:
+        doc: Document dictionary
+        embedding_model_id: Model ID for embeddings
+        embedding_dimensions: Dimensions for embeddings
+
+    Returns:
+        Hex SHA-256 of the content, metadata and embedding settings
+    """
+    fingerprint = json.dumps(
+        [embedding_model_id, embedding_dimensions, doc["content"], doc["metadata"]],
+        sort_keys=True,
+    )
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+
+def get_stored_document_hashes(
+    s3_vectors_client, vector_bucket_name: str, vector_index_name: str, keys: List[str]
+) -> Dict[str, str]:
+    """
+    Fetch the document hashes recorded on vectors already in the index.
+
+    Args:
+        s3_vectors_client: boto3 S3 Vectors client
+        vector_bucket_name: Name of the S3 Vectors bucket
+        vector_index_name: Name of the vector index
+        keys: Vector keys to look up
+
+    Returns:
+        Mapping of vector key to stored hash, for keys that exist and have one
+    """
+    stored_hashes = {}
+    for i in range(0, len(keys), GET_VECTORS_BATCH_SIZE):
+        response = s3_vectors_client.get_vectors(
+            vectorBucketName=vector_bucket_name,
+            indexName=vector_index_name,
+            keys=keys[i : i + GET_VECTORS_BATCH_SIZE],
+            returnData=False,
+            returnMetadata=True,
+        )
+        for vector in response.get("vectors", []):
+            content_hash = vector.get("metadata", {}).get(CONTENT_HASH_METADATA_KEY)
+            if content_hash:
+                stored_hashes[vector["key"]] = content_hash
+    return stored_hashes
+
+
+def build_vector(doc: Dict, embedding: List[float], content_hash: str) -> Dict:
+    """
+    Build the S3 Vectors entry for a document.
+
+    Args:
+        doc: Document dictionary
+        embedding: Embedding of the document's content
+        content_hash: Hash of the document from get_document_hash
+
+    Returns:
+        Vector dictionary ready for insertion
+    """
+    return {
+        "key": doc["key"],
+        "data": {"float32": embedding},
+        "metadata": {
+            "AMAZON_BEDROCK_TEXT": doc["content"],
+            "x-amz-bedrock-kb-source-uri": doc["metadata"].get(
+                "filename", doc["key"]
+            ),
+            **doc["metadata"],
+            CONTENT_HASH_METADATA_KEY: content_hash,
+        },
+    }
+
+
 def vectorize_and_store_documents(
     documents: List[Dict],
     s3_vectors_client,
@@ -398,57 +814,108 @@ def vectorize_and_store_documents(
             print("❌ No documents to process")
             return False
 
-        vectors_to_insert = []
+        # Skip documents whose vector is already stored with the same hash, so
+        # re-runs don't pay for embeddings and writes that change nothing
+        document_hashes = {
+            doc["key"]: get_document_hash(doc, embedding_model_id, embedding_dimensions)
+            for doc in documents
+        }
+        try:
+            stored_hashes = get_stored_document_hashes(
+                s3_vectors_client,
+                vector_bucket_name,
+                vector_index_name,
+                list(document_hashes),
+            )
+        except Exception as e:
+            print(f"⚠️  Could not check existing vectors, re-embedding all: {e}")
+            stored_hashes = {}
 
-        # Generate embeddings for each document
+        pending_documents = []
         for doc in documents:
-            print(f"  Processing: {doc['key']}")
+            if stored_hashes.get(doc["key"]) == document_hashes[doc["key"]]:
+                print(f"  Unchanged: {doc['key']}")
+            else:
+                pending_documents.append(doc)
 
-            # Create embedding request
-            embedding_request = {
-                "inputText": doc["content"],
-                "dimensions": embedding_dimensions,
-                "normalize": True,
-            }
+        if not pending_documents:
+            print(f"✅ All {len(documents)} documents are already up to date in S3 Vectors")
+            return True
+        documents = pending_documents
 
-            try:
-                # Get embedding from Bedrock
-                response = bedrock_runtime_client.invoke_model(
-                    modelId=embedding_model_id, body=json.dumps(embedding_request)
-                )
+        vectors_to_insert = []
+
+        # Generate embeddings concurrently - each document is an independent
+        # Bedrock round-trip, so the calls can overlap on the network. Documents
+        # with identical content share a single embedding request.
+        with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS) as executor:
+            futures_by_content = {}
+            for doc in documents:
+                if doc["content"] not in futures_by_content:
+                    futures_by_content[doc["content"]] = executor.submit(
+                        embed_document,
+                        doc["content"],
+                        bedrock_runtime_client,
+                        embedding_model_id,
+                        embedding_dimensions,
+                    )
 
-                response_body = json.loads(response["body"].read())
-                embedding = response_body["embedding"]
+            # Report progress from this thread only, in document order, so the
+            # workers never contend on stdout
+            embedded_contents = set()
+            for doc in documents:
+                try:
+                    embedding, cached = futures_by_content[doc["content"]].result()
+                except ClientError as e:
+                    # Throttling has already been retried by the client, so point
+                    # at the concurrency setting rather than a transient error
+                    if e.response["Error"]["Code"] == "ThrottlingException":
+                        print(
+                            f"⚠️  Failed to process {doc['key']}: throttled by Bedrock "
+                            f"(try lowering EMBEDDING_MAX_WORKERS, currently "
+                            f"{EMBEDDING_MAX_WORKERS})"
+                        )
+                    else:
+                        print(f"⚠️  Failed to process {doc['key']}: {e}")
+                    continue
+                except Exception as e:
+                    print(f"⚠️  Failed to process {doc['key']}: {e}")
+                    continue
 
-                # Prepare vector for insertion
+                if cached:
+                    print(f"  Processed: {doc['key']} (cached embedding)")
+                elif doc["content"] in embedded_contents:
+                    print(f"  Processed: {doc['key']} (duplicate content)")
+                else:
+                    print(f"  Processed: {doc['key']}")
+                embedded_contents.add(doc["content"])
                 vectors_to_insert.append(
-                    {
-                        "key": doc["key"],
-                        "data": {"float32": [float(x) for x in embedding]},
-                        "metadata": {
-                            "AMAZON_BEDROCK_TEXT": doc["content"],
-                            "x-amz-bedrock-kb-source-uri": doc["metadata"].get(
-                                "filename", doc["key"]
-                            ),
-                            **doc["metadata"],
-                        },
-                    }
+                    build_vector(doc, embedding, document_hashes[doc["key"]])
                 )
 
-            except Exception as e:
-                print(f"⚠️  Failed to process {doc['key']}: {e}")
-                continue
-
         if not vectors_to_insert:
             print("❌ No vectors to insert")
             return False
 
-        # Insert vectors into S3 Vectors index
-        s3_vectors_client.put_vectors(
-            vectorBucketName=vector_bucket_name,
-            indexName=vector_index_name,
-            vectors=vectors_to_insert,
-        )
+        # Insert vectors into S3 Vectors index, in batches no larger than the
+        # PutVectors limit and with the batches uploaded concurrently
+        batches = [
+            vectors_to_insert[i : i + PUT_VECTORS_BATCH_SIZE]
+            for i in range(0, len(vectors_to_insert), PUT_VECTORS_BATCH_SIZE)
+        ]
+        with ThreadPoolExecutor(
+            max_workers=min(PUT_VECTORS_MAX_WORKERS, len(batches))
+        ) as executor:
+            list(
+                executor.map(
+                    lambda batch: s3_vectors_client.put_vectors(
+                        vectorBucketName=vector_bucket_name,
+                        indexName=vector_index_name,
+                        vectors=batch,
+                    ),
+                    batches,
+                )
+            )
 
         print(
             f"✅ Successfully uploaded {len(vectors_to_insert)} documents to S3 Vectors"
@@ -460,6 +927,25 @@ def vectorize_and_store_documents(
         return False
 
 
+def find_knowledge_base_id(bedrock_agent_client, kb_name: str) -> Optional[str]:
+    """
+    Look up a Bedrock Knowledge Base by name.
+
+    Args:
+        bedrock_agent_client: boto3 Bedrock Agent client
+        kb_name: Name of the knowledge base
+
+    Returns:
+        Knowledge base ID if found, None otherwise
+    """
+    paginator = bedrock_agent_client.get_paginator("list_knowledge_bases")
+    for page in paginator.paginate():
+        for summary in page.get("knowledgeBaseSummaries", []):
+            if summary.get("name") == kb_name:
+                return summary.get("knowledgeBaseId") or summary.get("id")
+    return None
+
+
 def create_knowledge_base(
     bedrock_agent_client,
     vector_index_arn: str,
@@ -487,49 +973,68 @@ def create_knowledge_base(
     try:
         print("Creating Bedrock Knowledge Base...")
 
-        # Try to create Knowledge Base; if already exists, look it up
+        # Reuse an existing Knowledge Base with the same name on re-runs
+        knowledge_base_id = find_knowledge_base_id(bedrock_agent_client, kb_name)
+        if knowledge_base_id:
+            print(f"✅ Knowledge Base already exists, reusing it: {knowledge_base_id}")
+            return knowledge_base_id
+
+        # Try to create Knowledge Base; if it was created concurrently, look it up.
+        # A newly created role (and the policies attached to it) can take a while
+        # to become usable by Bedrock, so retry propagation errors with backoff
+        # until they are. Any other error is permanent and raised at once.
         kb_response = None
         try:
-            kb_response = bedrock_agent_client.create_knowledge_base(
-                name=kb_name,
-                description=("Knowledge base using S3 Vectors for document retrieval"),
-                roleArn=kb_role_arn,
-                knowledgeBaseConfiguration={
-                    "type": "VECTOR",
-                    "vectorKnowledgeBaseConfiguration": {
-                        "embeddingModelArn": (
-                            f"arn:aws:bedrock:{region_name}::foundation-model/"
-                            f"{embedding_model_id}"
-                        ),
-                        "embeddingModelConfiguration": {
-                            "bedrockEmbeddingModelConfiguration": {
-                                "dimensions": embedding_dimensions
-                            }
+            role_error = None
+            for _ in poll_with_backoff(KB_ROLE_PROPAGATION_MAX_WAIT, initial_delay=2.0):
+                try:
+                    kb_response = bedrock_agent_client.create_knowledge_base(
+                        name=kb_name,
+                        description=("Knowledge base using S3 Vectors for document retrieval"),
+                        roleArn=kb_role_arn,
+                        knowledgeBaseConfiguration={
+                            "type": "VECTOR",
+                            "vectorKnowledgeBaseConfiguration": {
+                                "embeddingModelArn": (
+                                    f"arn:aws:bedrock:{region_name}::foundation-model/"
+                                    f"{embedding_model_id}"
+                                ),
+                                "embeddingModelConfiguration": {
+                                    "bedrockEmbeddingModelConfiguration": {
+                                        "dimensions": embedding_dimensions
+                                    }
+                                },
+                            },
                         },
-                    },
-                },
-                storageConfiguration={
-                    "type": "S3_VECTORS",
-                    "s3VectorsConfiguration": {
-                        "indexArn": vector_index_arn,
-                    },
-                },
-                clientToken=str(uuid.uuid4()),
-            )
+                        storageConfiguration={
+                            "type": "S3_VECTORS",
+                            "s3VectorsConfiguration": {
+                                "indexArn": vector_index_arn,
+                            },
+                        },
+                        clientToken=str(uuid.uuid4()),
+                    )
+                    break
+                except ClientError as e:
+                    error = e.response["Error"]
+                    error_message = error.get("Message", "").lower()
+                    if error["Code"] == "AccessDeniedException" or (
+                        error["Code"] == "ValidationException"
+                        and any(m in error_message for m in KB_ROLE_PROPAGATION_MESSAGES)
+                    ):
+                        print("⏳ Waiting for Knowledge Base role to propagate...")
+                        role_error = e
+                        continue
+                    raise
+            else:
+                raise role_error
         except Exception as e:
             message = str(e)
             if "ConflictException" in message or "already exists" in message:
-                summaries = bedrock_agent_client.list_knowledge_bases().get(
-                    "knowledgeBaseSummaries", []
+                knowledge_base_id = find_knowledge_base_id(
+                    bedrock_agent_client, kb_name
                 )
-                existing = next(
-                    (k for k in summaries if k.get("name") == kb_name),
-                    None,
-                )
-                if existing:
-                    knowledge_base_id = existing.get("knowledgeBaseId") or existing.get(
-                        "id"
-                    )
+                if knowledge_base_id:
                     print(
                         "✅ Knowledge Base already exists, reusing it: "
                         f"{knowledge_base_id}"
@@ -566,7 +1071,9 @@ def wait_for_knowledge_base_ready(
     try:
         print("Waiting for Knowledge Base to be ready...")
 
-        for _ in range(max_wait_time // 2):
+        # Poll with exponential backoff so quick transitions are noticed right
+        # away and slow ones don't hammer the API
+        for _ in poll_with_backoff(max_wait_time):
             kb_status = bedrock_agent_client.get_knowledge_base(
                 knowledgeBaseId=knowledge_base_id
             )
@@ -580,7 +1087,6 @@ def wait_for_knowledge_base_ready(
                 return False
 
             print(f"  Status: {status}, waiting...")
-            time.sleep(2)
 
         print(f"❌ Knowledge Base creation timed out after {max_wait_time} seconds")
         return False
@@ -603,23 +1109,9 @@ def create_knowledge_base_role(role_name: str = "kb-service-role") -> Optional[s
     try:
         print(f"Creating Knowledge Base IAM role: {role_name}")
 
-        iam_client = boto3.client("iam")
-        sts_client = boto3.client("sts")
-
-        # Trust policy that allows Bedrock to assume this role
-        trust_policy = {
-            "Version": "2012-10-17",
-            "Statement": [
-                {
-                    "Effect": "Allow",
-                    "Principal": {"Service": "bedrock.amazonaws.com"},
-                    "Action": "sts:AssumeRole",
-                }
-            ],
-        }
+        iam_client = get_client("iam")
 
-        account_id = sts_client.get_caller_identity()["Account"]
-        role_arn = f"arn:aws:iam::{account_id}:role/{role_name}"
+        role_arn = f"arn:aws:iam::{get_account_id()}:role/{role_name}"
 
         # Check if role already exists
         role_exists = False
@@ -634,7 +1126,7 @@ def create_knowledge_base_role(role_name: str = "kb-service-role") -> Optional[s
             # Create the role
             iam_client.create_role(
                 RoleName=role_name,
-                AssumeRolePolicyDocument=json.dumps(trust_policy),
+                AssumeRolePolicyDocument=KB_ROLE_TRUST_POLICY,
                 Description="Execution role for Bedrock Knowledge Base operations",
             )
             print(f"✅ Created IAM role: {role_name}")
@@ -651,9 +1143,7 @@ def create_knowledge_base_role(role_name: str = "kb-service-role") -> Optional[s
 
             # Ensure custom policy for S3 Vectors permissions
             custom_policy_name = f"{role_name}-s3vectors-policy"
-            policy_json_path = os.path.join(
-                os.path.dirname(__file__), "policies", "S3VectorsFullAccess.json"
-            )
+            policy_json_path = os.path.join(POLICIES_DIR, "S3VectorsFullAccess.json")
             attach_custom_policy(
                 policy_name=custom_policy_name,
                 policy_json_path=policy_json_path,
@@ -661,35 +1151,8 @@ def create_knowledge_base_role(role_name: str = "kb-service-role") -> Optional[s
                 attach_to_name=role_name,
             )
 
-            # Wait for role to be fully created
-            print("⏳ Waiting for role to propagate...")
-            time.sleep(15)  # Wait for role to propagate
-
-        # Test role existence with retries
-        print("⏳ Verifying role is ready...")
-        max_retries = 24  # 2 minutes max wait
-        retry_delay = 5
-
-        for attempt in range(max_retries):
-            try:
-                # Check if the role exists and is accessible
-                iam_client.get_role(RoleName=role_name)
-                print(f"✅ Knowledge Base role {role_name} is ready!")
-                return role_arn
-
-            except Exception as check_error:
-                if attempt < max_retries - 1:
-                    print(
-                        f"⏳ Role not ready yet (attempt {attempt + 1}/{max_retries}), "
-                        f"waiting {retry_delay}s..."
-                    )
-                    time.sleep(retry_delay)
-                else:
-                    print(
-                        f"❌ Role verification failed after {max_retries} attempts: {check_error}"
-                    )
-                    return None
-
+        # Propagation of the new role and its policies is waited out by
+        # create_knowledge_base, which retries until Bedrock can use the role
         return role_arn
 
     except Exception as e:
@@ -734,7 +1197,10 @@ def setup_complete_knowledge_base(
                 "https://codesignal-staging-assets.s3.amazonaws.com/uploads/"
                 "1755867202135/techco-kb-sample-md.zip"
             )
-            zip_path = os.path.join(os.getcwd(), "techco-data.zip")
+            # The archive holds a docs/ folder, so extract it next to the
+            # documents folder rather than into the current directory
+            extract_dir = os.path.dirname(os.path.normpath(documents_folder))
+            zip_path = os.path.join(extract_dir, "techco-data.zip")
             # Download the zip file
             with urllib.request.urlopen(zip_url) as response, open(
                 zip_path, "wb"
@@ -742,17 +1208,15 @@ def setup_complete_knowledge_base(
                 shutil.copyfileobj(response, out_file)
             # Extract the zip file
             with zipfile.ZipFile(zip_path, "r") as zf:
-                zf.extractall()
+                zf.extractall(extract_dir)
             # Remove the zip file and README.md
             os.remove(zip_path)
-            os.remove("README.md")
+            os.remove(os.path.join(extract_dir, "README.md"))
 
         # Create AWS clients
-        s3_vectors_client = boto3.client("s3vectors", region_name=region_name)
-        bedrock_runtime_client = boto3.client(
-            "bedrock-runtime", region_name=region_name
-        )
-        bedrock_agent_client = boto3.client("bedrock-agent", region_name=region_name)
+        s3_vectors_client = get_client("s3vectors", region_name)
+        bedrock_runtime_client = get_client("bedrock-runtime", region_name)
+        bedrock_agent_client = get_client("bedrock-agent", region_name)
 
         # Step 1: Load documents
         documents = load_documents_from_folder(documents_folder)
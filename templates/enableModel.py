@@ -17,11 +17,12 @@ import os
 import time
 import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
-import boto3
 from botocore.auth import SigV4Auth
 from botocore.awsrequest import AWSRequest
 from botocore.exceptions import ClientError
+from common import get_client, get_session
 
 REGION = os.getenv("BEDROCK_REGION", "us-east-1")
 POLL_INTERVAL_S = float(os.getenv("POLL_INTERVAL_S", "3"))
@@ -37,8 +38,8 @@ SUBMIT_USE_CASE_JSON = {
 }
 
 
-def get_availability(br, model_id):
-    print(f"Getting availability for {model_id}")
+def get_availability(br, model_id, log=print):
+    log(f"Getting availability for {model_id}")
     return br.get_foundation_model_availability(modelId=model_id)
 
 
@@ -51,14 +52,14 @@ def explain_state(av):
     }
 
 
-def create_model_agreement(br, model_id):
-    print(f"Listing model agreement offers for {model_id}")
+def create_model_agreement(br, model_id, log=print):
+    log(f"Listing model agreement offers for {model_id}")
     offers = br.list_foundation_model_agreement_offers(modelId=model_id).get(
         "offers", []
     )
     if not offers:
         return False, "no_public_offers"
-    print(
+    log(
         f"Creating model agreement for {model_id} with offer token {offers[0]['offerToken']}"
     )
     br.create_foundation_model_agreement(
@@ -67,25 +68,24 @@ def create_model_agreement(br, model_id):
     return True, "offer_accepted"
 
 
-def submit_use_case(use_case):
+def submit_use_case(use_case, log=print):
     if not use_case:
         return "skipped"
-    print(f"Submitting use case: {use_case}")
-    br_global = boto3.client("bedrock", region_name=REGION)
+    log(f"Submitting use case: {use_case}")
+    br_global = get_client("bedrock", REGION)
     # boto3 expects raw bytes for 'formData'
     br_global.put_use_case_for_model_access(formData=json.dumps(use_case))
     return "submitted"
 
 
-def set_model_entitlement(model_id, region):
+def set_model_entitlement(model_id, region, log=print):
     """
     Flip the 'entitlementAvailability' gate via a signed POST.
     NOTE: This uses an endpoint that is not yet documented in public boto3,
     and may change.
     """
-    print(f"Setting model entitlement for {model_id} in {region}")
-    session = boto3.session.Session()
-    creds = session.get_credentials().get_frozen_credentials()
+    log(f"Setting model entitlement for {model_id} in {region}")
+    creds = get_session().get_credentials().get_frozen_credentials()
     url = f"https://bedrock.{region}.amazonaws.com/foundation-model-entitlement"
     body = json.dumps({"modelId": model_id}).encode("utf-8")
 
@@ -105,9 +105,9 @@ def set_model_entitlement(model_id, region):
         return r.status, payload
 
 
-def wait_until_ready(br, model_id, max_wait_s, poll_interval_s):
+def wait_until_ready(br, model_id, max_wait_s, poll_interval_s, log=print):
     end = time.time() + max_wait_s
-    last = explain_state(get_availability(br, model_id))
+    last = explain_state(get_availability(br, model_id, log))
     while time.time() < end:
         if all(
             [
@@ -119,7 +119,7 @@ def wait_until_ready(br, model_id, max_wait_s, poll_interval_s):
         ):
             return "enabled", last
         time.sleep(poll_interval_s)
-        last = explain_state(get_availability(br, model_id))
+        last = explain_state(get_availability(br, model_id, log))
     return "timeout", last
 
 
@@ -129,83 +129,127 @@ def enable_model(
     submit_use_case_json=SUBMIT_USE_CASE_JSON,
     max_wait_s=MAX_WAIT_S,
     poll_interval_s=POLL_INTERVAL_S,
+    log=print,
 ):
-    br = boto3.client("bedrock", region_name=region)
+    br = get_client("bedrock", region)
     steps = []
 
     try:
-        av = get_availability(br, model_id)
+        av = get_availability(br, model_id, log)
         state = explain_state(av)
         steps.append(f"start: {state}")
 
         if state["region"] == "NOT_AVAILABLE":
-            print(f"❌ Bedrock model {model_id} is not available in {region}")
+            log(f"❌ Bedrock model {model_id} is not available in {region}")
             return {"status": "blocked_region", "steps": steps, "final": state}
 
         if submit_use_case_json is not None:
-            print(f"Submitting use case for {model_id}")
+            log(f"Submitting use case for {model_id}")
             steps.append("submitting_use_case")
             try:
-                steps.append(submit_use_case(submit_use_case_json))
+                steps.append(submit_use_case(submit_use_case_json, log))
             except ClientError as e:
-                print(f"❌ Error submitting use case for {model_id}: {e}")
+                log(f"❌ Error submitting use case for {model_id}: {e}")
                 steps.append(f"use_case_error: {e}")
             time.sleep(2)
-            state = explain_state(get_availability(br, model_id))
+            state = explain_state(get_availability(br, model_id, log))
             steps.append(f"post-usecase: {state}")
 
         if state["agreement"] != "AVAILABLE":
-            print(f"Agreement not available. Creating model agreement for {model_id}")
-            ok, msg = create_model_agreement(br, model_id)
+            log(f"Agreement not available. Creating model agreement for {model_id}")
+            ok, msg = create_model_agreement(br, model_id, log)
             if not ok:
-                print(f"❌ Error creating model agreement for {model_id}: {msg}")
+                log(f"❌ Error creating model agreement for {model_id}: {msg}")
                 return {"status": "error", "steps": steps, "final": state}
             steps.append(msg)
             time.sleep(2)
-            state = explain_state(get_availability(br, model_id))
+            state = explain_state(get_availability(br, model_id, log))
             steps.append(f"post-agreement: {state}")
-            print(f"Model agreement created for {model_id}")
+            log(f"Model agreement created for {model_id}")
 
         if state["entitlement"] != "AVAILABLE":
-            print(
+            log(
                 f"Entitlement not available. Trying to set model entitlement for {model_id}"
             )
             try:
-                status_code, payload = set_model_entitlement(model_id, region)
+                status_code, payload = set_model_entitlement(model_id, region, log)
                 steps.append(
                     f"entitlement_post: http {status_code} payload={payload!r}"
                 )
                 time.sleep(2)
-                state = explain_state(get_availability(br, model_id))
+                state = explain_state(get_availability(br, model_id, log))
                 steps.append(f"post-entitlement: {state}")
-                print(f"Entitlement set for {model_id}")
+                log(f"Entitlement set for {model_id}")
             except urllib.error.HTTPError as e:
                 steps.append(
                     f"entitlement_http_error: {e.code} {e.read().decode('utf-8', 'ignore')}"
                 )
-                print(f"❌ Error setting model entitlement for {model_id}: {e}")
+                log(f"❌ Error setting model entitlement for {model_id}: {e}")
             except Exception as e:
                 steps.append(f"entitlement_error: {e!r}")
-                print(f"❌ Error setting model entitlement for {model_id}: {e}")
+                log(f"❌ Error setting model entitlement for {model_id}: {e}")
 
-        print(f"Waiting until ready for {model_id}")
+        log(f"Waiting until ready for {model_id}")
         status, final_state = wait_until_ready(
-            br, model_id, max_wait_s, poll_interval_s
+            br, model_id, max_wait_s, poll_interval_s, log
         )
-        print(f"Status: {status}, Final state: {final_state}")
+        log(f"Status: {status}, Final state: {final_state}")
         return {"status": status, "steps": steps, "final": final_state}
 
     except ClientError as e:
-        print(f"❌ Error enabling model {model_id}: {e}")
+        log(f"❌ Error enabling model {model_id}: {e}")
         return {
             "status": "error",
             "error": f"{e.response.get('Error', {}).get('Code')}: {e.response.get('Error', {}).get('Message')}",
             "steps": steps,
         }
     except Exception as e:
-        print(f"❌ Error enabling model {model_id}: {e}")
+        log(f"❌ Error enabling model {model_id}: {e}")
         return {
             "status": "error",
             "error": f"{e}",
             "steps": steps,
         }
+
+
+def enable_models(
+    model_ids,
+    region=REGION,
+    submit_use_case_json=SUBMIT_USE_CASE_JSON,
+    log=print,
+):
+    """
+    Enable several models at once. Bedrock has no batch API for this, so each
+    model's enable_model flow runs on its own thread.
+    The use-case form is account-wide, so it is submitted once up front rather
+    than by every model. Each model's progress is collected while the threads
+    run and logged afterwards, one model after another.
+    Returns a dict of model ID -> enable_model result, in the order given.
+    """
+    if not model_ids:
+        return {}
+
+    if submit_use_case_json is not None:
+        try:
+            submit_use_case(submit_use_case_json, log)
+        except ClientError as e:
+            log(f"❌ Error submitting use case: {e}")
+        time.sleep(2)
+
+    model_logs = {model_id: [] for model_id in model_ids}
+    with ThreadPoolExecutor(max_workers=len(model_ids)) as executor:
+        results = executor.map(
+            lambda model_id: enable_model(
+                model_id,
+                region,
+                submit_use_case_json=None,
+                log=model_logs[model_id].append,
+            ),
+            model_ids,
+        )
+        results = dict(zip(model_ids, results))
+
+    for model_id in model_ids:
+        for message in model_logs[model_id]:
+            log(message)
+    return results
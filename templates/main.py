@@ -1,4 +1,5 @@
 import os
+from botocore.config import Config
 from strands import Agent
 from strands.models import BedrockModel
 from strands_tools import calculator, retrieve
@@ -11,11 +12,16 @@ MODEL_ID = "us.anthropic.claude-sonnet-4-20250514-v1:0"
 GUARDRAIL_ID = os.getenv("GUARDRAIL_ID")
 GUARDRAIL_VERSION = os.getenv("GUARDRAIL_VERSION", "DRAFT")
 
-# Create a Bedrock model with guardrail configuration
+# Create a Bedrock model with guardrail configuration, keeping its HTTP
+# connections alive between requests. The tool definitions and system prompt
+# are identical on every call, so mark them as prompt cache points.
 model = BedrockModel(
     model_id=MODEL_ID,
     guardrail_id=GUARDRAIL_ID,
-    guardrail_version=GUARDRAIL_VERSION
+    guardrail_version=GUARDRAIL_VERSION,
+    cache_tools="default",
+    cache_prompt="default",
+    boto_client_config=Config(max_pool_connections=32, tcp_keepalive=True)
 )
 
 # Define the system prompt
@@ -31,19 +37,33 @@ agent = Agent(
 # Create the Bedrock AgentCore Runtime app wrapper
 app = BedrockAgentCoreApp()
 
+async def stream_response(user_prompt: str):
+    """
+    Streams the agent's response text as it is generated.
+    """
+    async for event in agent.stream_async(user_prompt):
+        # Only forward text chunks; other events carry internal agent state
+        if "data" in event:
+            yield event["data"]
+
 # Mark this function as the entrypoint for the AgentCore runtime
 @app.entrypoint
-def invoke(payload: dict):
+async def invoke(payload: dict):
     """
     Receives a payload with a 'prompt' key and asks the Strands agent.
-    Returns the agent's response in a dictionary.
+    Returns the agent's response in a dictionary, or streams it back as
+    server-sent events when the payload sets 'stream' to true.
     """
 
     # Get the prompt from the payload
     user_prompt = payload.get("prompt")
 
-    # Ask the agent directly
-    response = agent(user_prompt)
+    # Stream text chunks back as they arrive if the caller asked for it
+    if payload.get("stream"):
+        return stream_response(user_prompt)
+
+    # Ask the agent without blocking the server's event loop
+    response = await agent.invoke_async(user_prompt)
 
     # Return the result as a JSON-serializable dict
     return {"result": str(response)}
@@ -4,8 +4,8 @@ Cleanup script to remove all resources created by bedrockKnowledgeBase.py and be
 
 This script will remove:
 1. Bedrock Agent Core (deployed agent)
-2. ECR Repository (created by agentcore CLI)
-3. CodeBuild Project (created by agentcore CLI)
+2. ECR Repository (created by the AgentCore starter toolkit)
+3. CodeBuild Project (created by the AgentCore starter toolkit)
 4. S3 Config Backup Bucket (stores .bedrock_agentcore.yaml)
 5. Bedrock Knowledge Base
 6. IAM roles and custom policies (kb-service-role and AmazonBedrockAgentCoreSDKRuntime)
@@ -17,12 +17,46 @@ Note: This does NOT disable Bedrock models as they might be used by other resour
 """
 
 import boto3
+import io
+import os
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# Shared client configuration: bounded timeouts and adaptive retries so that
+# throttled cleanup calls back off instead of piling up retries
+BOTO_CONFIG = Config(
+    retries={"mode": "adaptive", "max_attempts": 5},
+    connect_timeout=5,
+    read_timeout=30,
+    max_pool_connections=32,
+    tcp_keepalive=True,
+)
+
+# Creating clients on boto3's default session is not thread-safe, and cleanup
+# steps run on several threads at once
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_client(service_name: str, region_name: str = None):
+    """Return a shared boto3 client for a service and region, created on first use"""
+    with _client_lock:
+        return boto3.client(service_name, region_name=region_name, config=BOTO_CONFIG)
+
+
+@lru_cache(maxsize=1)
+def get_account_id() -> str:
+    """Return the AWS account ID from AWS_ACCOUNT_ID if set, otherwise from STS (called at most once)"""
+    return os.getenv("AWS_ACCOUNT_ID") or get_client("sts").get_caller_identity()["Account"]
+
+
 # Configuration Constants
 REGION_NAME = "us-east-1"
-ACCOUNT_ID = boto3.client("sts").get_caller_identity()["Account"]
 AGENT_NAME = "my_agent"
 KB_NAME = "bedrock-knowledge-base"
 KB_ROLE_NAME = "kb-service-role"
@@ -31,7 +65,7 @@ AGENT_CORE_POLICY_NAME = "AmazonBedrockAgentCoreRuntimeExecutionPolicy"
 VECTOR_BUCKET_NAME = "bedrock-vector-bucket"
 VECTOR_INDEX_NAME = "bedrock-vector-index"
 GUARDRAIL_NAME = "aws-assistant-guardrail"
-CONFIG_BACKUP_BUCKET_NAME = f"bedrock-agentcore-config-backup-{ACCOUNT_ID}"
+CONFIG_BACKUP_BUCKET_PREFIX = "bedrock-agentcore-config-backup"
 USERNAME = "learner"
 
 # User policies to clean up
@@ -43,6 +77,30 @@ USER_POLICIES = [
 ]
 
 
+def list_attached_role_policies(iam_client, role_name: str) -> list:
+    """List every managed policy attached to a role, in as few pages as IAM allows"""
+    paginator = iam_client.get_paginator("list_attached_role_policies")
+    return [
+        policy
+        for page in paginator.paginate(
+            RoleName=role_name, PaginationConfig={"PageSize": 1000}
+        )
+        for policy in page.get("AttachedPolicies", [])
+    ]
+
+
+def list_role_policy_names(iam_client, role_name: str) -> list:
+    """List every inline policy name of a role, in as few pages as IAM allows"""
+    paginator = iam_client.get_paginator("list_role_policies")
+    return [
+        policy_name
+        for page in paginator.paginate(
+            RoleName=role_name, PaginationConfig={"PageSize": 1000}
+        )
+        for policy_name in page.get("PolicyNames", [])
+    ]
+
+
 def cleanup_bedrock_agent_core(agent_name: str = AGENT_NAME):
     """Remove Bedrock Agent Core deployment
     
@@ -51,12 +109,16 @@ def cleanup_bedrock_agent_core(agent_name: str = AGENT_NAME):
     """
     try:
         # Initialize the Bedrock Agent Core Control client
-        bedrock_agentcore_client = boto3.client('bedrock-agentcore-control', region_name=REGION_NAME)
+        bedrock_agentcore_client = get_client("bedrock-agentcore-control", REGION_NAME)
         
         # First, try to list agent runtimes to find the one we need to delete
         try:
-            response = bedrock_agentcore_client.list_agent_runtimes()
-            agent_runtimes = response.get("agentRuntimes", [])
+            paginator = bedrock_agentcore_client.get_paginator("list_agent_runtimes")
+            agent_runtimes = [
+                runtime
+                for page in paginator.paginate(PaginationConfig={"PageSize": 100})
+                for runtime in page.get("agentRuntimes", [])
+            ]
             
             if not agent_runtimes:
                 print("ℹ️  No agent runtimes found for cleanup")
@@ -98,75 +160,79 @@ def cleanup_bedrock_agent_core(agent_name: str = AGENT_NAME):
         print(f"❌ Error cleaning up Bedrock Agent Core: {e}")
 
 
+def delete_ecr_repository(ecr_client, repository_name: str) -> str:
+    """Delete an ECR repository together with all of its images and return a status message"""
+    try:
+        # force=True removes the images as part of the same call
+        ecr_client.delete_repository(repositoryName=repository_name, force=True)
+        return f"✅ Deleted ECR repository: {repository_name}"
+    except ecr_client.exceptions.RepositoryNotFoundException:
+        return f"ℹ️  ECR repository {repository_name} not found"
+    except Exception as e:
+        return f"⚠️  Could not delete ECR repository {repository_name}: {e}"
+
+
 def cleanup_ecr_repository(repository_name: str = AGENT_NAME):
-    """Remove ECR repository created by agentcore CLI"""
+    """Remove ECR repositories created by the AgentCore starter toolkit"""
     try:
-        ecr_client = boto3.client("ecr", region_name=REGION_NAME)
+        ecr_client = get_client("ecr", REGION_NAME)
         
         # First, list all repositories to see what exists
         try:
-            all_repos = ecr_client.describe_repositories()
-            repositories = all_repos.get('repositories', [])
+            paginator = ecr_client.get_paginator("describe_repositories")
+            repositories = [
+                repo
+                for page in paginator.paginate(PaginationConfig={"PageSize": 1000})
+                for repo in page.get('repositories', [])
+            ]
             
             if not repositories:
                 print("ℹ️  No ECR repositories found for cleanup")
                 return
             
-            # Look for repository that matches or contains our agent name
-            target_repo_name = None
+            # Look for repositories that match or contain our agent name
+            target_repo_names = []
             for repo in repositories:
                 repo_name = repo.get('repositoryName', '')
                 if repository_name in repo_name.lower() or repo_name.lower().startswith(repository_name.lower()):
-                    target_repo_name = repo_name
-                    break
+                    target_repo_names.append(repo_name)
             
-            if not target_repo_name:
+            if not target_repo_names:
                 print(f"ℹ️  No ECR repository found matching: {repository_name}")
                 print(f"🔍 Available repositories: {[repo.get('repositoryName') for repo in repositories]}")
                 return
             
-            # Delete all images in the repository first
-            response = ecr_client.list_images(repositoryName=target_repo_name)
-            image_ids = response.get('imageIds', [])
-            
-            if image_ids:
-                ecr_client.batch_delete_image(
-                    repositoryName=target_repo_name,
-                    imageIds=image_ids
+            # Repositories are independent, so delete them concurrently and
+            # print their results in order once all of them are done
+            with ThreadPoolExecutor(max_workers=min(len(target_repo_names), 8)) as executor:
+                messages = executor.map(
+                    lambda target_repo_name: delete_ecr_repository(ecr_client, target_repo_name),
+                    target_repo_names,
                 )
-                print(f"✅ Deleted {len(image_ids)} images from ECR repository: {target_repo_name}")
-            
-            # Delete the repository
-            ecr_client.delete_repository(
-                repositoryName=target_repo_name,
-                force=True
-            )
-            print(f"✅ Deleted ECR repository: {target_repo_name}")
+                for message in messages:
+                    print(message)
             
-        except ecr_client.exceptions.RepositoryNotFoundException:
-            print(f"ℹ️  ECR repository {repository_name} not found")
         except Exception as e:
-            print(f"⚠️  Could not delete ECR repository: {e}")
+            print(f"⚠️  Could not list ECR repositories: {e}")
             
     except Exception as e:
         print(f"❌ Error cleaning up ECR repository: {e}")
 
 
 def cleanup_codebuild_project(agent_name: str = AGENT_NAME):
-    """Remove CodeBuild project created by agentcore CLI"""
+    """Remove CodeBuild project created by the AgentCore starter toolkit"""
     try:
-        codebuild_client = boto3.client("codebuild", region_name=REGION_NAME)
+        codebuild_client = get_client("codebuild", REGION_NAME)
         
         # The project name follows the pattern: bedrock-agentcore-{agent_name}-builder
         project_name = f"bedrock-agentcore-{agent_name}-builder"
         
         # Check if the project exists first
         try:
-            # List projects to see if ours exists
-            response = codebuild_client.list_projects()
-            project_names = response.get('projects', [])
+            # Look the project up by name rather than listing every project in the account
+            response = codebuild_client.batch_get_projects(names=[project_name])
             
-            if project_name not in project_names:
+            if not response.get('projects'):
                 print(f"ℹ️  CodeBuild project {project_name} not found")
                 return
                 
@@ -184,15 +250,13 @@ def cleanup_codebuild_project(agent_name: str = AGENT_NAME):
 def cleanup_agent_core_execution_role():
     """Remove AmazonBedrockAgentCoreSDKRuntime IAM role and associated policies"""
     try:
-        iam_client = boto3.client('iam')
-        sts_client = boto3.client('sts')
-        account_id = sts_client.get_caller_identity()['Account']
+        iam_client = get_client("iam")
+        account_id = get_account_id()
         role_name = AGENT_CORE_ROLE_NAME
         
         # List attached policies
         try:
-            response = iam_client.list_attached_role_policies(RoleName=role_name)
-            policies = response.get('AttachedPolicies', [])
+            policies = list_attached_role_policies(iam_client, role_name)
             
             # Detach all policies
             for policy in policies:
@@ -228,16 +292,19 @@ def cleanup_agent_core_execution_role():
 def cleanup_knowledge_base(kb_name: str = KB_NAME, region_name: str = REGION_NAME):
     """Remove Bedrock Knowledge Base"""
     try:
-        bedrock_agent_client = boto3.client("bedrock-agent", region_name=region_name)
-        
-        # List knowledge bases to find the one we created
-        response = bedrock_agent_client.list_knowledge_bases()
-        kb_id = None
+        bedrock_agent_client = get_client("bedrock-agent", region_name)
         
-        for kb in response.get("knowledgeBaseSummaries", []):
-            if kb["name"] == kb_name:
-                kb_id = kb["knowledgeBaseId"]
-                break
+        # List knowledge bases (every page) to find the one we created
+        paginator = bedrock_agent_client.get_paginator("list_knowledge_bases")
+        kb_id = next(
+            (
+                kb["knowledgeBaseId"]
+                for page in paginator.paginate()
+                for kb in page.get("knowledgeBaseSummaries", [])
+                if kb["name"] == kb_name
+            ),
+            None,
+        )
         
         if kb_id:
             bedrock_agent_client.delete_knowledge_base(knowledgeBaseId=kb_id)
@@ -252,14 +319,12 @@ def cleanup_knowledge_base(kb_name: str = KB_NAME, region_name: str = REGION_NAM
 def cleanup_iam_role(role_name: str = KB_ROLE_NAME):
     """Remove IAM role and associated policies"""
     try:
-        iam_client = boto3.client('iam')
-        sts_client = boto3.client('sts')
-        account_id = sts_client.get_caller_identity()['Account']
+        iam_client = get_client("iam")
+        account_id = get_account_id()
         
         # List and detach managed policies
         try:
-            response = iam_client.list_attached_role_policies(RoleName=role_name)
-            policies = response.get('AttachedPolicies', [])
+            policies = list_attached_role_policies(iam_client, role_name)
             
             # Detach all managed policies
             for policy in policies:
@@ -270,8 +335,7 @@ def cleanup_iam_role(role_name: str = KB_ROLE_NAME):
                 print(f"✅ Detached managed policy {policy['PolicyName']} from role {role_name}")
             
             # List and delete inline policies
-            inline_response = iam_client.list_role_policies(RoleName=role_name)
-            inline_policies = inline_response.get('PolicyNames', [])
+            inline_policies = list_role_policy_names(iam_client, role_name)
             
             # Delete all inline policies
             for policy_name in inline_policies:
@@ -309,7 +373,7 @@ def cleanup_s3_vectors(vector_bucket_name: str = VECTOR_BUCKET_NAME,
                       region_name: str = REGION_NAME):
     """Remove S3 Vectors index and bucket"""
     try:
-        s3_vectors_client = boto3.client("s3vectors", region_name=region_name)
+        s3_vectors_client = get_client("s3vectors", region_name)
         
         # Check if vector bucket exists first
         try:
@@ -358,10 +422,11 @@ def cleanup_s3_vectors(vector_bucket_name: str = VECTOR_BUCKET_NAME,
         print(f"❌ Error cleaning up S3 Vectors: {e}")
 
 
-def cleanup_config_backup_bucket(bucket_name: str = CONFIG_BACKUP_BUCKET_NAME):
+def cleanup_config_backup_bucket(bucket_name: str = None):
     """Remove S3 bucket used for configuration backup"""
     try:
-        s3_client = boto3.client("s3", region_name=REGION_NAME)
+        bucket_name = bucket_name or f"{CONFIG_BACKUP_BUCKET_PREFIX}-{get_account_id()}"
+        s3_client = get_client("s3", REGION_NAME)
         
         # Check if bucket exists first
         try:
@@ -375,20 +440,23 @@ def cleanup_config_backup_bucket(bucket_name: str = CONFIG_BACKUP_BUCKET_NAME):
                 print(f"⚠️  Could not check S3 bucket {bucket_name}: {e}")
                 return
         
-        # Delete all objects in the bucket first
+        # Delete all objects in the bucket first, one delete_objects call per
+        # page of up to 1000 keys (the most a single call accepts)
         try:
-            # List all objects
-            response = s3_client.list_objects_v2(Bucket=bucket_name)
-            objects = response.get('Contents', [])
-            
-            if objects:
-                # Delete all objects
-                delete_objects = [{'Key': obj['Key']} for obj in objects]
+            paginator = s3_client.get_paginator('list_objects_v2')
+            deleted_count = 0
+            for page in paginator.paginate(Bucket=bucket_name, PaginationConfig={'PageSize': 1000}):
+                objects = page.get('Contents', [])
+                if not objects:
+                    continue
                 s3_client.delete_objects(
                     Bucket=bucket_name,
-                    Delete={'Objects': delete_objects}
+                    Delete={'Objects': [{'Key': obj['Key']} for obj in objects], 'Quiet': True}
                 )
-                print(f"✅ Deleted {len(objects)} objects from S3 bucket: {bucket_name}")
+                deleted_count += len(objects)
+            
+            if deleted_count:
+                print(f"✅ Deleted {deleted_count} objects from S3 bucket: {bucket_name}")
             
             # Delete the bucket
             s3_client.delete_bucket(Bucket=bucket_name)
@@ -404,16 +472,19 @@ def cleanup_config_backup_bucket(bucket_name: str = CONFIG_BACKUP_BUCKET_NAME):
 def cleanup_guardrail(region_name: str = REGION_NAME):
     """Remove Bedrock guardrail"""
     try:
-        bedrock_client = boto3.client("bedrock", region_name=region_name)
-        
-        # List guardrails to find the one we created
-        response = bedrock_client.list_guardrails()
-        guardrail_id = None
+        bedrock_client = get_client("bedrock", region_name)
         
-        for guardrail in response.get("guardrails", []):
-            if guardrail["name"] == GUARDRAIL_NAME:
-                guardrail_id = guardrail["id"]
-                break
+        # List guardrails (every page) to find the one we created
+        paginator = bedrock_client.get_paginator("list_guardrails")
+        guardrail_id = next(
+            (
+                guardrail["id"]
+                for page in paginator.paginate()
+                for guardrail in page.get("guardrails", [])
+                if guardrail["name"] == GUARDRAIL_NAME
+            ),
+            None,
+        )
         
         if guardrail_id:
             bedrock_client.delete_guardrail(guardrailIdentifier=guardrail_id)
@@ -428,7 +499,7 @@ def cleanup_guardrail(region_name: str = REGION_NAME):
 def cleanup_user_policies(username: str = USERNAME, policies: list = USER_POLICIES):
     """Remove IAM policies from user (optional)"""
     try:
-        iam_client = boto3.client('iam')
+        iam_client = get_client("iam")
         
         for policy_arn in policies:
             policy_name = policy_arn.split('/')[-1]
@@ -447,6 +518,49 @@ def cleanup_user_policies(username: str = USERNAME, policies: list = USER_POLICI
         print(f"❌ Error cleaning up user policies: {e}")
 
 
+class ThreadBufferedOutput:
+    """Stand-in for sys.stdout that keeps what registered threads print in their own buffers"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def write(self, text):
+        buffer = self.buffers.get(threading.get_ident())
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_cleanup_steps(steps: list):
+    """Run independent (title, step) cleanup steps concurrently, then print each step's output in order"""
+    output = ThreadBufferedOutput(sys.stdout)
+
+    def run_buffered(step):
+        output.buffers[threading.get_ident()] = buffer = io.StringIO()
+        try:
+            step()
+        finally:
+            del output.buffers[threading.get_ident()]
+        return buffer.getvalue()
+
+    # Steps print while running; hold that back so their lines don't mix
+    sys.stdout = output
+    try:
+        with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+            futures = [executor.submit(run_buffered, step) for _, step in steps]
+    finally:
+        sys.stdout = output.stream
+
+    for (title, _), future in zip(steps, futures):
+        print(title)
+        # Each step reports its own errors, so this only surfaces bugs
+        print(future.result())
+
+
 def main():
     print("=" * 70)
     print("BEDROCK KNOWLEDGE BASE & AGENT CORE CLEANUP")
@@ -458,7 +572,7 @@ def main():
     print(f"• Bedrock Agent Core deployment ({AGENT_NAME})")
     print(f"• ECR Repository (bedrock-agentcore-{AGENT_NAME})")
     print(f"• CodeBuild Project (bedrock-agentcore-{AGENT_NAME}-builder)")
-    print(f"• S3 Config Backup Bucket ({CONFIG_BACKUP_BUCKET_NAME})")
+    print(f"• S3 Config Backup Bucket ({CONFIG_BACKUP_BUCKET_PREFIX}-{get_account_id()})")
     print(f"• Bedrock Knowledge Base ({KB_NAME})")
     print(f"• IAM Roles ({KB_ROLE_NAME}, {AGENT_CORE_ROLE_NAME})")
     print("• Custom IAM policies")
@@ -473,42 +587,23 @@ def main():
     
     print("\n🧹 Starting cleanup...\n")
     
-    # Clean up in reverse order of creation (to handle dependencies)
-    print("1. Cleaning up Bedrock Agent Core...")
-    cleanup_bedrock_agent_core()
-    print()
-    
-    print("2. Cleaning up ECR Repository...")
-    cleanup_ecr_repository()
-    print()
+    # Clean up in two waves to handle dependencies: resources that nothing
+    # else depends on are removed concurrently first, then the roles and the
+    # vector store that the knowledge base and agent runtime were using
+    run_cleanup_steps([
+        ("1. Cleaning up Bedrock Agent Core...", cleanup_bedrock_agent_core),
+        ("2. Cleaning up ECR Repository...", cleanup_ecr_repository),
+        ("3. Cleaning up CodeBuild Project...", cleanup_codebuild_project),
+        ("4. Cleaning up S3 Config Backup Bucket...", cleanup_config_backup_bucket),
+        ("5. Cleaning up Knowledge Base...", cleanup_knowledge_base),
+        ("6. Cleaning up Guardrail...", cleanup_guardrail),
+    ])
     
-    print("3. Cleaning up CodeBuild Project...")
-    cleanup_codebuild_project()
-    print()
-    
-    print("4. Cleaning up S3 Config Backup Bucket...")
-    cleanup_config_backup_bucket()
-    print()
-    
-    print("5. Cleaning up Knowledge Base...")
-    cleanup_knowledge_base()
-    print()
-    
-    print("6. Cleaning up Knowledge Base IAM Role...")
-    cleanup_iam_role()
-    print()
-    
-    print("7. Cleaning up Agent Core Execution Role...")
-    cleanup_agent_core_execution_role()
-    print()
-    
-    print("8. Cleaning up S3 Vectors...")
-    cleanup_s3_vectors()
-    print()
-    
-    print("9. Cleaning up Guardrail...")
-    cleanup_guardrail()
-    print()
+    run_cleanup_steps([
+        ("7. Cleaning up Knowledge Base IAM Role...", cleanup_iam_role),
+        ("8. Cleaning up Agent Core Execution Role...", cleanup_agent_core_execution_role),
+        ("9. Cleaning up S3 Vectors...", cleanup_s3_vectors),
+    ])
     
     # Optional: Remove user policies
     remove_user_policies = input(f"Remove all Bedrock and Agent Core policies from user '{USERNAME}'? (y/N): ").strip().lower()